@@ -1,109 +1,267 @@
 
+import numpy as np
 import pandas as pd
 import glob
+import multiprocessing as mp
+import os
+import pickle
+from heapq import nlargest
+from operator import itemgetter
 from datetime import datetime
 from mmr_calculator import MMRCalculator, TOURNEY_WEIGHTS, TOURNEY_NAMES
 
-def load_data(pattern="data/atp_matches_*.csv"):
-    """Carrega e combina os dados dos arquivos CSV"""
-    csv_files = glob.glob(pattern)
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # PyArrow é opcional: sem ele a leitura usa o parser C do pandas
+    pa = None
+
+DATA_PATTERN = "data/atp_matches_*.csv"
+CACHE_DIR = "cache"  # Ratings processados, para não reprocessar os CSVs
+CACHE_FORMAT = 6  # Incrementar quando os atributos salvos do MMRCalculator mudarem
+
+PROGRESS_INTERVAL = 50_000  # Partidas entre mensagens de progresso
+
+# Colunas usadas por partida
+MATCH_COLUMNS = [
+    'winner_name', 'loser_name', 'surface', 'score', 'tourney_level',
+    'winner_seed', 'loser_seed', 'tourney_date', 'tourney_name',
+]
+
+# Opções aceitas no menu
+SURFACE_OPTIONS = ("clay", "hard", "grass")
+VALID_SURFACES = frozenset(SURFACE_OPTIONS)
+VALID_LEVELS = frozenset(TOURNEY_WEIGHTS)
+
+# Valor de colunas ausentes do CSV (as demais ficam vazias)
+MISSING_COLUMN_DEFAULTS = {'tourney_name': 'Unknown'}
+
+# Tipos das colunas lidas dos CSVs (as demais colunas nem são carregadas)
+MATCH_DTYPES = {
+    'winner_name': 'string',
+    'loser_name': 'string',
+    'surface': 'category',
+    'score': 'string',
+    'tourney_level': 'category',
+    'winner_seed': 'float32',
+    'loser_seed': 'float32',
+    'tourney_date': 'Int32',
+    'tourney_name': 'string',
+}
+
+def read_match_file(path):
+    """Lê um CSV de partidas com apenas as colunas usadas, já tipadas (colunas ausentes são ignoradas)"""
+    return pd.read_csv(path, usecols=lambda col: col in MATCH_DTYPES, dtype=MATCH_DTYPES, engine='c')
+
+def read_match_files(csv_files):
+    """Lê e combina uma lista de arquivos CSV de partidas"""
+    if pa is not None:
+        # Tabelas Arrow são concatenadas sem copiar os dados de cada arquivo
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=MATCH_COLUMNS,
+            include_missing_columns=True,
+            column_types={'winner_seed': pa.float32(), 'loser_seed': pa.float32(), 'tourney_date': pa.int32()},
+        )
+        tables = [pa_csv.read_csv(file, convert_options=convert_options) for file in csv_files]
+        # Colunas ausentes de um arquivo vêm com tipo nulo: promovidas ao tipo dos demais arquivos
+        table = pa.concat_tables(tables, promote_options="default")
+        # Colunas sem valor em nenhum arquivo são descartadas, para prepare_matches usar os valores padrão
+        table = table.select([field.name for field in table.schema if not pa.types.is_null(field.type)])
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    
+    if len(csv_files) == 1:
+        df_list = [read_match_file(csv_files[0])]
+    else:
+        # Cada arquivo é lido de forma independente: distribui a leitura entre os núcleos
+        with mp.Pool(min(len(csv_files), os.cpu_count() or 1)) as pool:
+            df_list = pool.map(read_match_file, csv_files)
+    return pd.concat(df_list, ignore_index=True)
+
+def find_match_files(pattern=DATA_PATTERN):
+    """Lista, em ordem, os arquivos CSV que correspondem ao padrão"""
+    csv_files = sorted(glob.glob(pattern))
     
     if not csv_files:
         raise FileNotFoundError(f"Nenhum arquivo encontrado com o padrão: {pattern}")
+    return csv_files
+
+def load_data(pattern=DATA_PATTERN):
+    """Carrega e combina os dados dos arquivos CSV"""
+    return read_match_files(find_match_files(pattern))
+
+def group_match_files(csv_files):
+    """
+    Agrupa os arquivos em blocos que podem ser processados um após o outro, em ordem cronológica:
+    arquivos cujos intervalos de datas se sobrepõem ficam no mesmo bloco.
+    Arquivos sem datas válidas formam o último bloco.
+    """
+    ranges = []
+    undated = []
+    for file in csv_files:
+        # Lê apenas a coluna de datas para descobrir o intervalo de cada arquivo
+        dates = pd.read_csv(file, usecols=lambda col: col == 'tourney_date', dtype={'tourney_date': 'Int32'})
+        dates = dates['tourney_date'].dropna() if 'tourney_date' in dates.columns else dates
+        if dates.empty:
+            undated.append(file)
+        else:
+            ranges.append((dates.min(), dates.max(), file))
     
-    df_list = [pd.read_csv(file) for file in csv_files]
-    return pd.concat(df_list, ignore_index=True)
+    groups = []
+    group_end = None
+    for start, end, file in sorted(ranges):
+        if groups and start <= group_end:
+            groups[-1].append(file)
+            group_end = max(group_end, end)
+        else:
+            groups.append([file])
+            group_end = end
+    if undated:
+        groups.append(undated)
+    return groups
 
-def process_matches(df, mmr):
-    """Processa as partidas e atualiza os ratings com decaimento temporal"""
+def find_decay_points(tourney_dates, last_date=None):
+    """
+    Encontra as partidas antes das quais o decaimento global deve ser aplicado:
+    na primeira partida de um novo mês, se passaram mais de 30 dias desde a última mudança de mês.
+    last_date é a data da última mudança de mês vista antes destas partidas (se houver).
+    Retorna a lista de (índice, data anterior, nova data, dias) e a data da última mudança de mês.
+    """
+    # Converte as datas uma única vez e trabalha com chaves inteiras de mês e dia
+    dates = pd.to_datetime(tourney_dates, format='%Y%m%d', errors='coerce').to_numpy()
+    valid = np.flatnonzero(~np.isnat(dates))  # NaT indica data ausente ou inválida
+    dates = dates[valid]
+    if last_date is not None:
+        # A mudança de mês anterior entra como uma partida fictícia de índice -1
+        valid = np.concatenate(([-1], valid))
+        dates = np.concatenate(([np.datetime64(last_date, 'ns')], dates))
+    month_key = dates.astype('datetime64[M]').view('int64')
+    day_key = dates.astype('datetime64[D]').view('int64')
+    
+    # Primeira partida de cada novo mês e dias desde a mudança de mês anterior
+    changes = np.flatnonzero(np.diff(month_key, prepend=month_key[:1] - 1))
+    days_diff = np.diff(day_key[changes])
+    
+    points = []
+    for j in np.flatnonzero(days_diff > 30):
+        previous, current = changes[j], changes[j + 1]
+        points.append((
+            valid[current].item(),
+            pd.Timestamp(dates[previous]).to_pydatetime(),
+            pd.Timestamp(dates[current]).to_pydatetime(),
+            days_diff[j].item(),
+        ))
+    
+    if len(changes):
+        last_date = pd.Timestamp(dates[changes[-1]]).to_pydatetime()
+    return points, last_date
+
+def prepare_matches(df):
+    """Ordena, filtra e normaliza as partidas, garantindo todas as colunas de MATCH_COLUMNS"""
+    # Colunas ausentes são resolvidas aqui, uma vez, e não a cada partida
+    missing = {col: MISSING_COLUMN_DEFAULTS.get(col) for col in MATCH_COLUMNS if col not in df.columns}
+    df = df.assign(**missing)[MATCH_COLUMNS]
+    
     # Ordena as partidas por data (importante para o decay temporal)
-    if 'tourney_date' in df.columns:
-        df = df.sort_values('tourney_date')
+    df = df.sort_values('tourney_date', kind='stable')
     
     # Filtro opcional para remover dados incompletos
     df = df.dropna(subset=['winner_name', 'loser_name'])
     
-    # Contador para acompanhar o progresso
-    total_matches = len(df)
-    processed = 0
-    
+    # Normaliza valores ausentes e tipos de uma vez, coluna a coluna
+    dates = df['tourney_date']
+    df['surface'] = df['surface'].astype(object).fillna('unknown').astype(str).str.lower()
+    df['tourney_level'] = df['tourney_level'].astype(object).fillna('X')
+    df['tourney_date'] = dates.astype('Int64').astype(str).astype(object).where(dates.notna(), None)
+    for col in ('score', 'winner_seed', 'loser_seed'):
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df
+
+def process_matches(df, mmr):
+    """Processa as partidas e atualiza os ratings com decaimento temporal"""
+    results, _ = process_prepared_matches(prepare_matches(df), mmr)
+    return results
+
+def process_match_files(csv_files, mmr, collect_results=False):
+    """
+    Processa os arquivos bloco a bloco (ver group_match_files), mantendo em memória
+    apenas as partidas de um bloco por vez. Retorna o número de partidas processadas
+    ou, com collect_results=True, os resultados de todas elas (que crescem com o acervo).
+    """
     results = []
+    total_matches = 0
     last_date = None
+    for group in group_match_files(csv_files):
+        df = prepare_matches(read_match_files(group))
+        group_results, last_date = process_prepared_matches(df, mmr, last_date, collect_results)
+        total_matches += len(df)
+        if collect_results:
+            results.append(group_results)
+    if not collect_results:
+        return total_matches
+    return pd.concat(results, ignore_index=True)
+
+def process_prepared_matches(df, mmr, last_date=None, collect_results=True):
+    """
+    Processa partidas já preparadas (ver prepare_matches) em ordem.
+    last_date é a data da última mudança de mês das partidas processadas antes destas.
+    Retorna os resultados por partida (None com collect_results=False) e a nova data da última mudança de mês.
+    """
+    total_matches = len(df)
+    batches = []
     
-    for _, row in df.iterrows():
-        winner = row['winner_name']
-        loser = row['loser_name']
-        surface = str(row['surface']).lower() if pd.notna(row['surface']) else 'unknown'
-        score = row['score'] if 'score' in row and pd.notna(row['score']) else None
-        tourney_level = row['tourney_level'] if 'tourney_level' in row and pd.notna(row['tourney_level']) else 'X'
-        win_seed = row['winner_seed'] if 'winner_seed' in row and pd.notna(row['winner_seed']) else None
-        loser_seed = row['loser_seed'] if 'loser_seed' in row and pd.notna(row['loser_seed']) else None
-        tourney_date = row['tourney_date'] if 'tourney_date' in row and pd.notna(row['tourney_date']) else None
-        
-        # Converter tourney_date para string se for um número
-        if tourney_date is not None:
-            tourney_date = str(tourney_date)
-        
-        # Aplica decaimento global se a data mudou significativamente (ex: mês diferente)
-        if tourney_date and (last_date is None or tourney_date[:6] != last_date[:6]):
-            if last_date is not None:
-                try:
-                    old_date = datetime.strptime(last_date, '%Y%m%d')
-                    new_date = datetime.strptime(tourney_date, '%Y%m%d')
-                    days_diff = (new_date - old_date).days
-                    
-                    # Se passaram mais de 30 dias, aplica decay global
-                    if days_diff > 30:
-                        mmr.set_current_date(new_date)
-                        mmr.apply_global_decay()
-                        print(f"Aplicado decaimento temporal: {old_date.strftime('%d/%m/%Y')} -> {new_date.strftime('%d/%m/%Y')} ({days_diff} dias)")
-                except Exception as e:
-                    print(f"Erro ao aplicar decaimento: {e}")
+    # Registra todos os jogadores do bloco antes, para alocar os arrays de estado uma única vez
+    mmr.fit_player_index(df)
+    
+    # Processa as partidas em trechos entre aplicações do decaimento global
+    start = 0
+    decay_points, last_date = find_decay_points(df['tourney_date'], last_date)
+    for end, previous_date, match_date, days_diff in decay_points + [(total_matches, None, None, 0)]:
+        if end > start:
+            # O decaimento temporal depende da data atual do MMR, fixa dentro do trecho
+            deltas = mmr.update_ratings_batch(df.iloc[start:end])
+            if collect_results:
+                batches.append(deltas)
             
-            last_date = tourney_date
+            # Atualiza contador
+            if end // PROGRESS_INTERVAL > start // PROGRESS_INTERVAL or end == total_matches:
+                print(f"Processado: {end}/{total_matches} partidas ({end/total_matches*100:.1f}%)")
         
-        try:
-            # Atualiza ratings
-            update_result = mmr.update_rating(
-                winner, loser, score, surface, tourney_level, 
-                win_seed, loser_seed, tourney_date
-            )
-            
-            # Armazena resultados para análise
-            results.append({
-                'tourney_name': row['tourney_name'] if 'tourney_name' in row else 'Unknown',
-                'tourney_date': tourney_date,
-                'winner': winner,
-                'loser': loser,
-                'surface': surface,
-                'level': tourney_level,
-                'delta_winner': update_result['delta_winner'],
-                'delta_loser': update_result['delta_loser'],
-                'time_decay': update_result['factors']['time_decay'] if 'time_decay' in update_result['factors'] else 1.0,
-                'score': score
-            })
-        except Exception as e:
-            print(f"Erro ao processar partida: {winner} vs {loser} - {e}")
+        # Se passaram mais de 30 dias, aplica decay global (se ativado)
+        if match_date is not None and mmr.decay_rate is not None:
+            mmr.set_current_date(match_date)
+            mmr.apply_global_decay()
+            print(f"Aplicado decaimento temporal: {previous_date.strftime('%d/%m/%Y')} -> {match_date.strftime('%d/%m/%Y')} ({days_diff} dias)")
         
-        # Atualiza contador
-        processed += 1
-        if processed % 1000 == 0 or processed == total_matches:
-            print(f"Processado: {processed}/{total_matches} partidas ({processed/total_matches*100:.1f}%)")
+        start = end
     
-    return pd.DataFrame(results)
+    if not collect_results:
+        return None, last_date
+    
+    # Resultados numéricos dos trechos; as colunas de texto vêm direto do DataFrame
+    deltas = pd.concat(batches) if batches else pd.DataFrame(columns=['delta_winner', 'delta_loser', 'time_decay'], dtype=float)
+    results = pd.DataFrame({
+        'tourney_name': df['tourney_name'].to_numpy(),
+        'tourney_date': df['tourney_date'].to_numpy(),
+        'winner': df['winner_name'].to_numpy(),
+        'loser': df['loser_name'].to_numpy(),
+        'surface': df['surface'].to_numpy(),
+        'level': df['tourney_level'].to_numpy(),
+        'delta_winner': deltas['delta_winner'].to_numpy(),
+        'delta_loser': deltas['delta_loser'].to_numpy(),
+        'time_decay': deltas['time_decay'].to_numpy(),
+        'score': df['score'].to_numpy(),
+    })
+    return results, last_date
 
 def print_rankings(mmr, category="geral", surface=None, level=None, top_n=10, min_matches=3):
     """Imprime os rankings conforme a categoria selecionada"""
-    # Obtém os ratings para a categoria específica
-    ratings = mmr.get_combined_rankings(surface, level, min_matches)
+    # Obtém os top_n ratings da categoria específica, já ordenados
+    ranking = mmr.get_top_rankings(surface, level, min_matches, top_n)
     
-    if not ratings:
+    if not ranking:
         print(f"Nenhum jogador encontrado com os critérios especificados (mínimo {min_matches} partidas)")
         return
     
-    # Ordena por rating
-    ranking = sorted(ratings.items(), key=lambda x: x[1], reverse=True)
-    
     # Título composto
     title_parts = []
     if level:
@@ -115,20 +273,12 @@ def print_rankings(mmr, category="geral", surface=None, level=None, top_n=10, mi
     print(f"\n{title}:")
     
     # Imprime ranking
-    for i, (name, rating) in enumerate(ranking[:top_n], 1):
+    for i, (name, rating) in enumerate(ranking, 1):
         # Exibe número de partidas jogadas no contexto específico
-        if surface and level:
-            matches = mmr.matches_combined[name].get(f"{surface}_{level}", 0)
-        elif surface:
-            matches = mmr.matches_by_surface[name].get(surface, 0)
-        elif level:
-            matches = mmr.matches_by_level[name].get(level, 0)
-        else:
-            matches = mmr.matches_played.get(name, 0)
-            
-        print(f"{i}. {name}: {round(rating, 2)} ({matches} partidas)")
+        matches = mmr.get_matches(name, surface, level)
+        print(f"{i}. {name}: {rating:.2f} ({matches} partidas)")
     
-    return ranking[:top_n]
+    return ranking
 
 def analyze_player(mmr, player_name):
     """Analisa e exibe estatísticas de um jogador específico"""
@@ -137,7 +287,7 @@ def analyze_player(mmr, player_name):
         return
     
     print(f"\n--- Análise de {player_name} ---")
-    print(f"Rating geral: {round(mmr.ratings[player_name], 2)}")
+    print(f"Rating geral: {mmr.ratings[player_name]:.2f}")
     print(f"Partidas jogadas: {mmr.matches_played.get(player_name, 0)}")
     
     # Ratings por superfície
@@ -145,7 +295,7 @@ def analyze_player(mmr, player_name):
     if player_name in mmr.surfaces:
         for surface, rating in sorted(mmr.surfaces[player_name].items(), key=lambda x: x[1], reverse=True):
             matches = mmr.matches_by_surface[player_name].get(surface, 0)
-            print(f"- {surface.capitalize()}: {round(rating, 2)} ({matches} partidas)")
+            print(f"- {surface.capitalize()}: {rating:.2f} ({matches} partidas)")
     
     # Ratings por nível de torneio
     print("\nRatings por nível de torneio:")
@@ -153,78 +303,139 @@ def analyze_player(mmr, player_name):
         for level, rating in sorted(mmr.levels[player_name].items(), key=lambda x: x[1], reverse=True):
             matches = mmr.matches_by_level[player_name].get(level, 0)
             tourney_type = TOURNEY_NAMES.get(level, level)
-            print(f"- {tourney_type}: {round(rating, 2)} ({matches} partidas)")
+            print(f"- {tourney_type}: {rating:.2f} ({matches} partidas)")
     
     # Top 3 combinações (superfície + nível)
     print("\nMelhores combinações (superfície + nível):")
     if player_name in mmr.combined:
         combined_ratings = [(k, v, mmr.matches_combined[player_name].get(k, 0)) 
                           for k, v in mmr.combined[player_name].items()]
-        combined_ratings.sort(key=lambda x: x[1], reverse=True)
         
-        for i, (key, rating, matches) in enumerate(combined_ratings[:5], 1):
+        for i, (key, rating, matches) in enumerate(nlargest(5, combined_ratings, key=itemgetter(1)), 1):
             if matches < 2:  # Ignora combinações com poucas partidas
                 continue
                 
             surface, level = key.split('_')
             tourney_type = TOURNEY_NAMES.get(level, level)
-            print(f"{i}. {surface.capitalize()} + {tourney_type}: {round(rating, 2)} ({matches} partidas)")
+            print(f"{i}. {surface.capitalize()} + {tourney_type}: {rating:.2f} ({matches} partidas)")
+
+def read_cache(name, key):
+    """Lê o valor salvo em cache/<name>.pkl, se a chave salva junto for igual a key"""
+    try:
+        with open(os.path.join(CACHE_DIR, f"{name}.pkl"), 'rb') as f:
+            saved_key, value = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    return value if saved_key == key else None
+
+def write_cache(name, key, value):
+    """Salva value em cache/<name>.pkl junto com a chave que o valida"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(os.path.join(CACHE_DIR, f"{name}.pkl"), 'wb') as f:
+        pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def build_ratings(csv_files, files_key, decay_rate, reference_date):
+    """
+    Processa as partidas e retorna (mmr, número de partidas processadas).
+    Reaproveita o estado em cache se os CSVs, a taxa de decaimento e a data de referência forem os mesmos.
+    """
+    key = {"format": CACHE_FORMAT, "files": files_key, "decay_rate": decay_rate, "reference_date": reference_date.strftime('%Y%m%d')}
+    cache_name = f"mmr_{decay_rate}"  # Um estado por taxa de decaimento
+    cached = read_cache(cache_name, key)
+    if cached is not None:
+        print("Ratings carregados do cache")
+        return cached
+    
+    mmr = MMRCalculator(k=32, decay_rate=decay_rate, current_date=reference_date)
+    
+    # Processa partidas
+    print("Processando partidas...")
+    total_matches = process_match_files(csv_files, mmr)
+    print(f"Partidas processadas: {total_matches}")
+    write_cache(cache_name, key, (mmr, total_matches))
+    return mmr, total_matches
+
+def parse_decay_rate(text):
+    """Converte a taxa digitada; 1 desativa o decaimento (None). Levanta ValueError se inválida."""
+    try:
+        decay_rate = float(text)
+    except ValueError:
+        raise ValueError("Valor inválido.") from None
+    if decay_rate <= 0 or decay_rate > 1:
+        raise ValueError("Taxa de decaimento deve estar entre 0 e 1.")
+    return None if decay_rate == 1 else decay_rate
+
+def describe_decay_rate(decay_rate):
+    """Descreve a taxa de decaimento em uso"""
+    if decay_rate is None:
+        return "Decaimento temporal desativado"
+    return f"Usando taxa de decaimento de {decay_rate} (representa {(1-decay_rate)*100}% por ano)"
+
+def print_decay_stats(decay_stats):
+    """Imprime as estatísticas retornadas por apply_global_decay"""
+    print(f"Jogadores afetados: {decay_stats['affected_players']}")
+    print(f"Decaimento médio: {decay_stats['average_decay']:.2f} pontos")
+    print(f"Decaimento máximo: {decay_stats['max_decay']:.2f} pontos")
+    print(f"Dias considerados: {decay_stats['days_applied']}")
+    print(f"Fator de decaimento: {decay_stats['decay_multiplier']:.6f} ({(1-decay_stats['decay_multiplier'])*100:.2f}%)")
+
+def ask_int(question, default):
+    """Pergunta um inteiro não negativo; retorna default se a resposta não for um número"""
+    answer = input(f"{question} (padrão: {default}) ").strip()
+    return int(answer) if answer.isdigit() else default
+
+def ask_surface():
+    """Pergunta uma superfície; retorna None (após avisar) se for inválida"""
+    surface = input(f"Qual superfície? ({'/'.join(SURFACE_OPTIONS)}) ").strip().lower()
+    if surface not in VALID_SURFACES:
+        print(f"Superfície inválida. Opções: {', '.join(SURFACE_OPTIONS)}")
+        return None
+    return surface
+
+def ask_level():
+    """Pergunta um nível de torneio; retorna None (após avisar) se for inválido"""
+    level = input("Qual nível? (G=Grand Slam, M=Masters, A=ATP500, B=ATP250) ").strip().upper()
+    if level not in VALID_LEVELS:
+        print(f"Nível inválido. Opções: {', '.join(TOURNEY_WEIGHTS)}")
+        return None
+    return level
 
 def main():
-    # Carrega dados
-    print("Carregando dados...")
+    # Localiza dados (os arquivos são lidos bloco a bloco durante o processamento)
     try:
-        df = load_data()
-        print(f"Dados carregados: {len(df)} partidas")
+        csv_files = find_match_files()
     except FileNotFoundError as e:
         print(f"Erro: {e}")
         return
+    files_key = {file: os.path.getmtime(file) for file in csv_files}
+    print(f"Arquivos de dados: {len(csv_files)}")
     
     # Inicializa calculadora de MMR com decay rate
-    decay_rate = input("Taxa de decaimento anual (0.85 = 15% por ano, padrão): ")
+    decay_rate = input("Taxa de decaimento anual (0.85 = 15% por ano, padrão; 1 = sem decaimento): ")
     try:
-        decay_rate = float(decay_rate) if decay_rate else 0.85
-        if decay_rate <= 0 or decay_rate >= 1:
-            print("Taxa de decaimento deve estar entre 0 e 1. Usando valor padrão 0.85.")
-            decay_rate = 0.85
-    except ValueError:
-        print("Valor inválido. Usando taxa de decaimento padrão 0.85.")
+        decay_rate = parse_decay_rate(decay_rate) if decay_rate else 0.85
+    except ValueError as e:
+        print(f"{e} Usando taxa de decaimento padrão 0.85.")
         decay_rate = 0.85
     
-    mmr = MMRCalculator(k=32, decay_rate=decay_rate)
-    print(f"Usando taxa de decaimento de {decay_rate} (representa {(1-decay_rate)*100}% por ano)")
+    print(describe_decay_rate(decay_rate))
     
     # Define data atual para cálculos de decay
     today = datetime.now()
-    mmr.set_current_date(today)
     print(f"Data atual para cálculos de decaimento: {today.strftime('%d/%m/%Y')}")
-
-    # Antes de processar as partidas, defina a data de início
-    start_date = df['tourney_date'].min() if 'tourney_date' in df.columns else None
-    if start_date and isinstance(start_date, str) and len(start_date) == 8:
-        mmr.set_current_date(datetime.strptime(start_date, '%Y%m%d'))
-        mmr.last_decay_date = mmr.current_date  # Inicializa a última data de decay
     
-    # Processa partidas
-    print("Processando partidas...")
-    results_df = process_matches(df, mmr)
+    mmr, _ = build_ratings(csv_files, files_key, decay_rate, today)
     
     # Imprime rankings
     print_rankings(mmr, top_n=20)
     
     print("\nAplicando decaimento global baseado em tempo...")
     today = datetime.now()
-    decay_stats = mmr.apply_global_decay(today)
-    print(f"Jogadores afetados: {decay_stats['affected_players']}")
-    print(f"Decaimento médio: {decay_stats['average_decay']:.2f} pontos")
-    print(f"Decaimento máximo: {decay_stats['max_decay']:.2f} pontos")
-    print(f"Dias considerados: {decay_stats['days_applied']}")
-    print(f"Fator de decaimento: {decay_stats['decay_multiplier']:.6f} ({(1-decay_stats['decay_multiplier'])*100:.2f}%)")
+    print_decay_stats(mmr.apply_global_decay(today))
     
     # Imprime rankings por superfície se houver dados suficientes
-    surfaces = ["clay", "hard", "grass"]
-    for surface in surfaces:
-        if any(surface in player_surfaces for player_surfaces in mmr.surfaces.values()):
+    for surface in SURFACE_OPTIONS:
+        if surface in mmr.surfaces_seen:
             print_rankings(mmr, surface=surface, top_n=10)
     
     # Menu interativo
@@ -242,50 +453,38 @@ def main():
         choice = input("Escolha uma opção: ")
         
         if choice == "1":
-            top_n = input("Quantos jogadores exibir? (padrão: 20) ")
-            top_n = int(top_n) if top_n.isdigit() else 20
-            min_matches = input("Mínimo de partidas? (padrão: 3) ")
-            min_matches = int(min_matches) if min_matches.isdigit() else 3
+            top_n = ask_int("Quantos jogadores exibir?", 20)
+            min_matches = ask_int("Mínimo de partidas?", 3)
             print_rankings(mmr, top_n=top_n, min_matches=min_matches)
             
         elif choice == "2":
-            surface = input("Qual superfície? (clay/hard/grass) ").lower()
-            if surface not in surfaces:
-                print(f"Superfície inválida. Opções: {', '.join(surfaces)}")
+            surface = ask_surface()
+            if surface is None:
                 continue
-            top_n = input("Quantos jogadores exibir? (padrão: 10) ")
-            top_n = int(top_n) if top_n.isdigit() else 10
-            min_matches = input("Mínimo de partidas? (padrão: 3) ")
-            min_matches = int(min_matches) if min_matches.isdigit() else 3
+            top_n = ask_int("Quantos jogadores exibir?", 10)
+            min_matches = ask_int("Mínimo de partidas?", 3)
             print_rankings(mmr, surface=surface, top_n=top_n, min_matches=min_matches)
             
         elif choice == "3":
-            level = input("Qual nível? (G=Grand Slam, M=Masters, A=ATP500, B=ATP250) ").upper()
-            if level not in TOURNEY_WEIGHTS.keys():
-                print(f"Nível inválido. Opções: {', '.join(TOURNEY_WEIGHTS.keys())}")
+            level = ask_level()
+            if level is None:
                 continue
-            top_n = input("Quantos jogadores exibir? (padrão: 10) ")
-            top_n = int(top_n) if top_n.isdigit() else 10
-            min_matches = input("Mínimo de partidas? (padrão: 3) ")
-            min_matches = int(min_matches) if min_matches.isdigit() else 3
+            top_n = ask_int("Quantos jogadores exibir?", 10)
+            min_matches = ask_int("Mínimo de partidas?", 3)
             print_rankings(mmr, level=level, top_n=top_n, min_matches=min_matches)
             
         elif choice == "4":
-            surface = input("Qual superfície? (clay/hard/grass) ").lower()
-            if surface not in surfaces:
-                print(f"Superfície inválida. Opções: {', '.join(surfaces)}")
+            surface = ask_surface()
+            if surface is None:
                 continue
                 
-            level = input("Qual nível? (G=Grand Slam, M=Masters, A=ATP500, B=ATP250) ").upper()
-            if level not in TOURNEY_WEIGHTS.keys():
-                print(f"Nível inválido. Opções: {', '.join(TOURNEY_WEIGHTS.keys())}")
+            level = ask_level()
+            if level is None:
                 continue
                 
-            top_n = input("Quantos jogadores exibir? (padrão: 10) ")
-            top_n = int(top_n) if top_n.isdigit() else 10
+            top_n = ask_int("Quantos jogadores exibir?", 10)
             
-            min_matches = input("Mínimo de partidas? (padrão: 2) ")
-            min_matches = int(min_matches) if min_matches.isdigit() else 2
+            min_matches = ask_int("Mínimo de partidas?", 2)
             
             print_rankings(mmr, surface=surface, level=level, top_n=top_n, min_matches=min_matches)
             
@@ -294,20 +493,19 @@ def main():
             analyze_player(mmr, player)
             
         elif choice == "6":
-            new_decay = input("Nova taxa de decaimento anual (0.85 = 15% por ano): ")
+            new_decay = input("Nova taxa de decaimento anual (0.85 = 15% por ano; 1 = sem decaimento): ")
             try:
-                new_decay = float(new_decay)
-                if new_decay <= 0 or new_decay >= 1:
-                    print("Taxa de decaimento deve estar entre 0 e 1.")
-                    continue
-                
-                mmr.decay_rate = new_decay
-                print(f"Taxa de decaimento atualizada para {new_decay} ({(1-new_decay)*100}% por ano)")
-                
-                # Recalcular ratings seria necessário reprocessar todos os dados
-                print("Nota: Para aplicar a nova taxa, é necessário reprocessar os dados.")
-            except ValueError:
-                print("Valor inválido.")
+                new_decay = parse_decay_rate(new_decay)
+            except ValueError as e:
+                print(e)
+                continue
+            
+            print(describe_decay_rate(new_decay))
+            
+            # Reprocessa com a nova taxa (ou reaproveita o cache) e aplica o decaimento até hoje
+            today = datetime.now()
+            mmr, _ = build_ratings(csv_files, files_key, new_decay, today)
+            print_decay_stats(mmr.apply_global_decay(today))
                 
         elif choice == "7":
             # Opção para ajustar a data de referência
@@ -318,12 +516,7 @@ def main():
                 if new_date:
                     # Converte a string para datetime
                     mmr.set_current_date(datetime.strptime(new_date, '%d/%m/%Y'))
-                    decay_stats = mmr.apply_global_decay()
-                    print(f"Jogadores afetados: {decay_stats['affected_players']}")
-                    print(f"Decaimento médio: {decay_stats['average_decay']:.2f} pontos")
-                    print(f"Decaimento máximo: {decay_stats['max_decay']:.2f} pontos")
-                    print(f"Dias considerados: {decay_stats['days_applied']}")
-                    print(f"Fator de decaimento: {decay_stats['decay_multiplier']:.6f} ({(1-decay_stats['decay_multiplier'])*100:.2f}%)")
+                    print_decay_stats(mmr.apply_global_decay())
                 else:
                     mmr.set_current_date(datetime.now())
                 
@@ -1,7 +1,29 @@
+import hashlib
+import inspect
 import math
 import re
-import pandas as pd
+import string
+from collections.abc import Mapping
+from itertools import chain
 from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit, prange
+except ImportError:  # Numba é opcional: sem ele o kernel roda como Python puro
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+    prange = range
+
+try:
+    import mmr_kernel  # Kernel já compilado por mmr_kernel_aot.py (sem custo de JIT)
+except ImportError:
+    mmr_kernel = None
 
 TOURNEY_WEIGHTS = {
     "G": 1.5,  # Grand Slam
@@ -23,118 +45,499 @@ TOURNEY_NAMES = {
     "C": "Challenger"
 }
 
+# Superfícies e níveis com colunas reservadas nos arrays de estado (outros valores ganham colunas ao aparecer)
+SURFACES = ("clay", "hard", "grass", "carpet")
+LEVELS = tuple(TOURNEY_WEIGHTS)
+LEVEL_WEIGHT_ARR = np.array([TOURNEY_WEIGHTS[level] for level in LEVELS])  # Peso por código de nível (índice em LEVELS)
+
+# Limpeza do placar: remove letras e '/' ('RET', 'W/O', ...) e depois trechos entre parênteses (tiebreaks)
+_SCORE_LETTERS = str.maketrans('', '', string.ascii_letters + '/')
+_SCORE_PARENTHESES = re.compile(r'\([^)]*\)')
+_SCORE_SET = re.compile(r'(?<!\S)\+?(\d+)-\+?(\d+)(?!\S)')  # Set "w-l" isolado entre espaços
+
+# Escalas do ELO já multiplicadas por ln(10), para usar exp no lugar de 10 ** x
+_INV400_LN10 = math.log(10) / 400
+_INV1600_LN10 = math.log(10) / 1600
+_MAX_EXP = 700.0  # Maior expoente passado a exp (acima de ~709 o resultado estoura float64)
+
+RANKINGS_CACHE_SIZE = 10  # Consultas de ranking guardadas por MMRCalculator
+RANK_INDEX_MIN_SIZE = 256  # Jogadores ordenados na primeira montagem de um índice de ranking
+
+# Tamanho médio mínimo das épocas (partidas sem jogadores em comum) para usar o kernel paralelo
+PARALLEL_MIN_EPOCH = 256
+
+def _resized(arr, shape, fill):
+    """Copia arr para um novo array com o formato dado, preenchendo o restante com fill"""
+    new = np.full(shape, fill, dtype=arr.dtype)
+    new[tuple(slice(0, n) for n in arr.shape)] = arr
+    return new
+
+@lru_cache(maxsize=8192)
+def _parse_score(score):
+    """Fator de placar de MMRCalculator.parse_score para um placar em texto (memorizado: placares se repetem muito)"""
+    # Remove parênteses e textos como 'RET', 'W/O', etc.
+    clean_score = score.translate(_SCORE_LETTERS)
+    if '(' in clean_score:
+        clean_score = _SCORE_PARENTHESES.sub('', clean_score)
+    
+    sets_won = {"winner": 0, "loser": 0}
+    total_games_diff = 0
+
+    for set_score in clean_score.split():
+        if '-' not in set_score:
+            continue
+        try:
+            w, l = map(int, set_score.split('-'))
+            sets_won["winner"] += w > l
+            sets_won["loser"] += l > w
+            total_games_diff += abs(w - l)
+        except ValueError:
+            continue
+
+    set_diff = sets_won["winner"] - sets_won["loser"]
+    if set_diff <= 0:
+        return 1.0
+
+    return min(2.0, 1.0 + 0.1 * set_diff + 0.01 * total_games_diff)
+
+@lru_cache(maxsize=4096)
+def _seed_factor(win_seed, loser_seed):
+    """Fator de seed de MMRCalculator.calculate_seed_factor (memorizado: há poucos pares de seeds)"""
+    # Inicializa com valor neutro
+    seed_factor = 1.0
+    
+    # Se ambas as seeds existem, podemos comparar
+    if win_seed is not None and loser_seed is not None:
+        # Se o perdedor tinha seed melhor (menor número)
+        if loser_seed < win_seed:
+            # Quanto maior a diferença, maior o fator
+            seed_factor = 1.0 + min(0.5, (win_seed - loser_seed) / 10)
+        # Se o vencedor tinha seed muito melhor que o perdedor
+        elif win_seed < loser_seed and (loser_seed - win_seed) > 8:
+            # Vitória esperada = menos pontos
+            seed_factor = max(0.7, 1.0 - (loser_seed - win_seed) / 20)
+            
+    return seed_factor
+
+@lru_cache(maxsize=8192)
+def _time_decay_factor(decay_rate, days_diff):
+    """Fator de MMRCalculator.calculate_time_decay_factor (memorizado: poucas datas distintas por data atual)"""
+    # Aplica fórmula de decaimento exponencial: decay_rate^anos (fração de anos)
+    decay_factor = decay_rate ** (days_diff / 365.25)
+    
+    # Garante um valor mínimo de 0.1 para partidas muito antigas
+    return max(0.1, decay_factor)
+
+def _top_order(values, ids, n):
+    """Retorna os n ids de maior valor em ordem decrescente (empates na ordem dos ids), sem ordenar todos"""
+    if n < len(ids):
+        # Seleciona em tempo linear o n-ésimo maior valor e mantém todos os empatados com ele
+        threshold = np.partition(values[ids], len(ids) - n)[len(ids) - n]
+        ids = ids[values[ids] >= threshold]
+    return ids[np.argsort(-values[ids], kind='stable')][:n]
+
+@njit(cache=True, fastmath=True)
+def _apply_match(t, rating, played, rating_surface, rating_level,
+                 rating_combined, played_grid, winner_ids, loser_ids, surface_ids, level_ids,
+                 weights, k, delta_winner, delta_loser, expected):
+    """
+    Aplica a partida t aos arrays de estado (ids negativos = ausente).
+    played_grid conta partidas por (jogador, superfície + 1, nível + 1), com a posição 0 para ausente.
+    """
+    w = winner_ids[t]
+    l = loser_ids[t]
+    s = surface_ids[t]
+    v = level_ids[t]
+    c = s * rating_level.shape[1] + v  # Coluna combinada (superfície, nível)
+
+    # Ratings atuais, com os mesmos fallbacks de get_rating
+    rw = rating[w]
+    rl = rating[l]
+    rw_surface = rating_surface[w, s] if s >= 0 else rw
+    rl_surface = rating_surface[l, s] if s >= 0 else rl
+    rw_level = rating_level[w, v] if v >= 0 else rw
+    rl_level = rating_level[l, v] if v >= 0 else rl
+    if s >= 0 and v >= 0:
+        rw_combined = rating_combined[w, c]
+        rl_combined = rating_combined[l, c]
+    elif s >= 0:
+        rw_combined = rw_surface
+        rl_combined = rl_surface
+    else:
+        rw_combined = rw_level
+        rl_combined = rl_level
+
+    # Probabilidade esperada de vitória (ELO padrão) e considerando superfície + nível
+    # (10 ** (x / 400) escrito como exp(x * ln(10) / 400), com o expoente limitado para diferenças
+    # extremas de rating não estourarem: sem Numba seria OverflowError, com fastmath um inf indefinido)
+    expected_w = 1 / (1 + math.exp(min((rl - rw) * _INV400_LN10, _MAX_EXP)))
+    expected_w_combined = 1 / (1 + math.exp(min(((rl + rl_surface + rl_level + rl_combined) -
+                                                 (rw + rw_surface + rw_level + rw_combined)) * _INV1600_LN10, _MAX_EXP)))
+    expected_w_final = (expected_w + expected_w_combined) / 2
+
+    # Fator de experiência (K menor para jogadores com mais partidas)
+    k_winner = k / (1 + played[w] / 100)
+    k_loser = k / (1 + played[l] / 100)
+
+    delta_base = weights[t] * (1 - expected_w_final)
+    delta_winner[t] = k_winner * delta_base
+    delta_loser[t] = k_loser * delta_base
+    expected[t] = expected_w_final
+
+    # Atualiza contadores e ratings
+    played[w] += 1
+    played[l] += 1
+    played_grid[w, s + 1, v + 1] += 1
+    played_grid[l, s + 1, v + 1] += 1
+    rating[w] += delta_winner[t]
+    rating[l] -= delta_loser[t]
+    if s >= 0:
+        rating_surface[w, s] += delta_winner[t]
+        rating_surface[l, s] -= delta_loser[t]
+    if v >= 0:
+        rating_level[w, v] += delta_winner[t]
+        rating_level[l, v] -= delta_loser[t]
+    if s >= 0 and v >= 0:
+        rating_combined[w, c] += delta_winner[t]
+        rating_combined[l, c] -= delta_loser[t]
+
+@njit(cache=True, fastmath=True)
+def _apply_matches(rating, played, rating_surface, rating_level,
+                   rating_combined, played_grid, winner_ids, loser_ids, surface_ids, level_ids,
+                   weights, k, delta_winner, delta_loser, expected):
+    """Aplica em ordem uma sequência de partidas aos arrays de estado"""
+    for t in range(len(winner_ids)):
+        _apply_match(t, rating, played, rating_surface, rating_level,
+                     rating_combined, played_grid, winner_ids, loser_ids, surface_ids, level_ids,
+                     weights, k, delta_winner, delta_loser, expected)
+
+@njit(cache=True)
+def _epoch_starts(winner_ids, loser_ids, n_players):
+    """
+    Divide a sequência de partidas em épocas consecutivas em que nenhum jogador aparece duas vezes.
+    Retorna os índices de início de cada época, seguidos do total de partidas.
+    """
+    n = len(winner_ids)
+    starts = np.empty(n + 1, dtype=np.int64)
+    last_epoch = np.full(n_players, -1, dtype=np.int64)  # Última época em que o jogador apareceu
+    n_epochs = 0
+    for t in range(n):
+        w = winner_ids[t]
+        l = loser_ids[t]
+        if n_epochs == 0 or last_epoch[w] == n_epochs - 1 or last_epoch[l] == n_epochs - 1:
+            starts[n_epochs] = t
+            n_epochs += 1
+        last_epoch[w] = n_epochs - 1
+        last_epoch[l] = n_epochs - 1
+    starts[n_epochs] = n
+    return starts[:n_epochs + 1]
+
+@njit(cache=True, fastmath=True, parallel=True)
+def _apply_matches_parallel(epoch_starts, rating, played, rating_surface, rating_level,
+                            rating_combined, played_grid, winner_ids, loser_ids, surface_ids, level_ids,
+                            weights, k, delta_winner, delta_loser, expected):
+    """
+    Como _apply_matches, mas com as partidas de cada época em paralelo: dentro de uma época
+    cada partida altera apenas as linhas dos seus dois jogadores. As épocas seguem em ordem.
+    """
+    for e in range(len(epoch_starts) - 1):
+        for t in prange(epoch_starts[e], epoch_starts[e + 1]):
+            _apply_match(t, rating, played, rating_surface, rating_level,
+                         rating_combined, played_grid, winner_ids, loser_ids, surface_ids, level_ids,
+                         weights, k, delta_winner, delta_loser, expected)
+
+def _kernel_source_hash():
+    """Hash do código-fonte do kernel serial, para reconhecer um mmr_kernel compilado de outra versão"""
+    functions = (getattr(func, 'py_func', func) for func in (_apply_match, _apply_matches))
+    source = "".join(inspect.getsource(func) for func in functions)
+    return int.from_bytes(hashlib.sha256(source.encode()).digest()[:7], 'little')
+
+if mmr_kernel is not None and mmr_kernel.source_hash() != _kernel_source_hash():
+    mmr_kernel = None  # Compilado de um kernel diferente do atual: usa o JIT até recompilar
+
+class _PlayerValues(Mapping):
+    """Visão somente leitura nome -> valor sobre um array de estado indexado por id de jogador"""
+
+    def __init__(self, calculator, attr):
+        self._calculator = calculator
+        self._attr = attr
+
+    def __getitem__(self, name):
+        pid = self._calculator._player_ids[name]
+        return getattr(self._calculator, self._attr)[pid].item()
+
+    def __iter__(self):
+        return iter(self._calculator._player_names)
+
+    def __len__(self):
+        return len(self._calculator._player_names)
+
+class _PlayerLanes(Mapping):
+    """
+    Visão somente leitura nome -> {chave: valor}, apenas com as chaves em que o jogador atuou.
+    attr e counts_attr nomeiam um array indexado por id de jogador ou um método que recebe o id.
+    """
+
+    def __init__(self, calculator, attr, counts_attr, labels_attr):
+        self._calculator = calculator
+        self._attr = attr
+        self._counts_attr = counts_attr
+        self._labels_attr = labels_attr
+
+    def _row(self, attr, pid):
+        source = getattr(self._calculator, attr)
+        return source(pid) if callable(source) else source[pid]
+
+    def __getitem__(self, name):
+        calculator = self._calculator
+        pid = calculator._player_ids[name]
+        values = self._row(self._attr, pid)
+        counts = self._row(self._counts_attr, pid)
+        labels = getattr(calculator, self._labels_attr)
+        return {labels[i]: values[i].item() for i in np.flatnonzero(counts)}
+
+    def __iter__(self):
+        return iter(self._calculator._player_names)
+
+    def __len__(self):
+        return len(self._calculator._player_names)
+
 class MMRCalculator:
-    def __init__(self, k=32, default_rating=1500, decay_rate=0.85):
+    def __init__(self, k=32, default_rating=1500, decay_rate=0.85, scientific=False, current_date=None, parallel=False):
         self.k = k
         self.default_rating = default_rating
-        self.decay_rate = decay_rate  # Quanto menor, mais rápido o decay (0.85 = 15% por ano)
-        self.ratings = {}  # nome -> rating (float)
-        self.surfaces = {}  # nome -> {"clay": r, "grass": r, ...}
-        self.levels = {}  # nome -> {"G": r, "M": r, ...}
-        self.combined = {}  # nome -> {"clay_M": r, "hard_G": r, ...}
-        self.matches_played = {}  # nome -> número de partidas jogadas
-        self.matches_by_surface = {}  # nome -> {"clay": n, "hard": n, ...}
-        self.matches_by_level = {}  # nome -> {"G": n, "M": n, ...}
-        self.matches_combined = {}  # nome -> {"clay_M": n, "hard_G": n, ...}
-        self.current_date = datetime.now()  # Data atual para cálculo de decay
-        self.last_decay_date = self.current_date  # Inicializa com a data atual
+        self.decay_rate = decay_rate  # Quanto menor, mais rápido o decay (0.85 = 15% por ano; None = sem decay)
+        # Ratings em float32 (metade da memória); scientific=True usa float64, como a implementação original
+        self.rating_dtype = np.float64 if scientific else np.float32
+        # Kernel paralelo por épocas: só compensa em blocos com muitas partidas sem jogadores em comum,
+        # o que não acontece em partidas ordenadas por data (~8 por época nos dados da ATP)
+        self.parallel = parallel
+        
+        # Ids inteiros de jogadores, superfícies e níveis (índices dos arrays de estado)
+        self._player_ids = {}  # nome -> id
+        self._player_names = []  # id -> nome
+        self._surface_ids = {}  # "clay" -> id
+        self._surface_names = []
+        self._level_ids = {}  # "G" -> id
+        self._level_names = []
+        self._combined_names = []  # "clay_G", "clay_F", ... na ordem das colunas de rating_combined
+        
+        # Rankings já calculados, válidos enquanto os ratings não mudarem
+        self._version = 0  # Incrementado a cada alteração dos ratings
+        self._rankings_version = 0
+        self._rankings_cache = {}  # (surface, level, min_matches) -> ranking
+        self._rank_index = {}  # (surface, level) -> (ids dos melhores em ordem decrescente de rating, se inclui todos)
+        
+        # Estado em arrays: linhas = jogadores, colunas = superfícies/níveis
+        # (combinado: coluna superfície * número de níveis + nível)
+        self.rating_arr = np.full(0, float(default_rating), dtype=self.rating_dtype)
+        self.matches_played_arr = np.zeros(0, dtype=np.int32)
+        self.rating_surface = np.full((0, 0), float(default_rating), dtype=self.rating_dtype)
+        self.rating_level = np.full((0, 0), float(default_rating), dtype=self.rating_dtype)
+        self.rating_combined = np.full((0, 0), float(default_rating), dtype=self.rating_dtype)
+        # Único contador por contexto: (jogador, superfície + 1, nível + 1), com a posição 0 para ausente.
+        # As partidas por superfície, por nível e combinadas são somas/fatias dele
+        self.matches_grid = np.zeros((0, 1, 1), dtype=np.int32)
+        for surface in SURFACES:
+            self._register(self._surface_ids, self._surface_names, surface)
+        for level in LEVELS:
+            self._register(self._level_ids, self._level_names, level)
+        self._grow()
+        
+        # Visões no formato de dicionário sobre os arrays
+        self.ratings = _PlayerValues(self, 'rating_arr')  # nome -> rating (float)
+        self.surfaces = _PlayerLanes(self, 'rating_surface', 'matches_by_surface_of', '_surface_names')  # nome -> {"clay": r, "grass": r, ...}
+        self.levels = _PlayerLanes(self, 'rating_level', 'matches_by_level_of', '_level_names')  # nome -> {"G": r, "M": r, ...}
+        self.combined = _PlayerLanes(self, 'rating_combined', 'matches_combined_of', '_combined_names')  # nome -> {"clay_M": r, "hard_G": r, ...}
+        self.matches_played = _PlayerValues(self, 'matches_played_arr')  # nome -> número de partidas jogadas
+        self.matches_by_surface = _PlayerLanes(self, 'matches_by_surface_of', 'matches_by_surface_of', '_surface_names')  # nome -> {"clay": n, "hard": n, ...}
+        self.matches_by_level = _PlayerLanes(self, 'matches_by_level_of', 'matches_by_level_of', '_level_names')  # nome -> {"G": n, "M": n, ...}
+        self.matches_combined = _PlayerLanes(self, 'matches_combined_of', 'matches_combined_of', '_combined_names')  # nome -> {"clay_M": n, "hard_G": n, ...}
+        
+        # Data atual para cálculo de decay; sem data, acompanha a partida mais recente processada
+        # (assim nenhuma partida tem idade negativa, o que faria o decaimento virar crescimento)
+        self.current_date = None
+        self.last_decay_date = None  # Inicializa com a primeira data atual definida
+        self._follow_match_dates = True  # Desligado ao definir a data explicitamente
+        if current_date is not None:
+            self.set_current_date(current_date)
 
     def get_rating(self, player, surface=None, level=None):
         """Retorna o rating de um jogador, geral ou específico para superfície/torneio"""
+        pid = self._player_ids.get(player)
+        if pid is None:
+            return self.default_rating
+        
         # Se ambos estão especificados, use o rating combinado
         if surface and level:
-            combined_key = f"{surface}_{level}"
-            if player in self.combined and combined_key in self.combined[player]:
-                return self.combined[player][combined_key]
-            return self.default_rating
+            lane = self._lane(surface, level)
+            return self.default_rating if lane < 0 else self.rating_combined[pid, lane].item()
             
         if surface:
-            return self.surfaces.get(player, {}).get(surface, self.default_rating)
+            sid = self._surface_ids.get(surface)
+            return self.default_rating if sid is None else self.rating_surface[pid, sid].item()
         if level:
-            return self.levels.get(player, {}).get(level, self.default_rating)
-        return self.ratings.get(player, self.default_rating)
+            lid = self._level_ids.get(level)
+            return self.default_rating if lid is None else self.rating_level[pid, lid].item()
+        return self.rating_arr[pid].item()
     
-    def ensure_player_initialized(self, name, surface, level):
-        """Inicializa dados do jogador se necessário"""
-        # Ratings gerais
-        if name not in self.ratings:
-            self.ratings[name] = self.default_rating
-            self.matches_played[name] = 0
-        
-        # Ratings por superfície
-        if name not in self.surfaces:
-            self.surfaces[name] = {}
-            self.matches_by_surface[name] = {}
-        if surface and surface not in self.surfaces[name]:
-            self.surfaces[name][surface] = self.default_rating
-            self.matches_by_surface[name][surface] = 0
-            
-        # Ratings por nível de torneio
-        if name not in self.levels:
-            self.levels[name] = {}
-            self.matches_by_level[name] = {}
-        if level and level not in self.levels[name]:
-            self.levels[name][level] = self.default_rating
-            self.matches_by_level[name][level] = 0
-            
-        # Ratings combinados (superfície + nível)
-        if name not in self.combined:
-            self.combined[name] = {}
-            self.matches_combined[name] = {}
-        
+    def get_matches(self, player, surface=None, level=None):
+        """Retorna o número de partidas de um jogador, geral ou específico para superfície/torneio"""
+        pid = self._player_ids.get(player)
+        if pid is None:
+            return 0
+        sid = self._surface_ids.get(surface)
+        lid = self._level_ids.get(level)
+        
+        # Mesma escolha de contexto de get_rating, com ids inteiros no lugar de chaves "superfície_nível"
         if surface and level:
-            combined_key = f"{surface}_{level}"
-            if combined_key not in self.combined[name]:
-                self.combined[name][combined_key] = self.default_rating
-                self.matches_combined[name][combined_key] = 0
+            return 0 if sid is None or lid is None else self.matches_grid[pid, sid + 1, lid + 1].item()
+        if surface:
+            return 0 if sid is None else self.matches_grid[pid, sid + 1, :].sum().item()
+        if level:
+            return 0 if lid is None else self.matches_grid[pid, :, lid + 1].sum().item()
+        return self.matches_played_arr[pid].item()
+    
+    @property
+    def surfaces_seen(self):
+        """Superfícies com ao menos uma partida processada (calculadas das contagens, sob demanda)"""
+        seen = self.matches_grid[:, 1:, :].any(axis=(0, 2))
+        return {self._surface_names[i] for i in np.flatnonzero(seen)}
+    
+    @property
+    def levels_seen(self):
+        """Níveis com ao menos uma partida processada (calculados das contagens, sob demanda)"""
+        seen = self.matches_grid[:, :, 1:].any(axis=(0, 1))
+        return {self._level_names[i] for i in np.flatnonzero(seen)}
+    
+    @staticmethod
+    def _register(ids, names, key):
+        """Retorna o id de key, registrando-o se for novo"""
+        if key not in ids:
+            ids[key] = len(names)
+            names.append(key)
+        return ids[key]
+    
+    def _grow(self):
+        """Realoca os arrays de estado se surgiram jogadores, superfícies ou níveis novos"""
+        capacity = len(self.rating_arr)
+        if len(self._player_names) > capacity:
+            # Dobra a capacidade para amortizar inserções de um jogador por vez
+            capacity = max(len(self._player_names), 2 * capacity)
+        old_shape = (len(self.rating_arr), self.rating_surface.shape[1], self.rating_level.shape[1])
+        shape = (capacity, len(self._surface_names), len(self._level_names))
+        if old_shape == shape:
+            return
+        
+        default = float(self.default_rating)
+        self.rating_arr = _resized(self.rating_arr, shape[:1], default)
+        self.matches_played_arr = _resized(self.matches_played_arr, shape[:1], 0)
+        self.rating_surface = _resized(self.rating_surface, shape[:2], default)
+        self.rating_level = _resized(self.rating_level, shape[::2], default)
+        
+        # As colunas combinadas são realocadas como (jogador, superfície, nível) e achatadas de volta
+        self.rating_combined = _resized(self.rating_combined.reshape(old_shape), shape, default).reshape(capacity, shape[1] * shape[2])
+        self.matches_grid = _resized(self.matches_grid, (capacity, shape[1] + 1, shape[2] + 1), 0)
+        self._combined_names = [f"{surface}_{level}" for surface in self._surface_names
+                                for level in self._level_names]
+    
+    def matches_by_surface_of(self, players=slice(None)):
+        """Partidas por superfície dos jogadores dados (id ou fatia de ids), somando todos os níveis"""
+        return self.matches_grid[players, 1:, :].sum(axis=-1)
+    
+    def matches_by_level_of(self, players=slice(None)):
+        """Partidas por nível dos jogadores dados (id ou fatia de ids), somando todas as superfícies"""
+        return self.matches_grid[players, :, 1:].sum(axis=-2)
+    
+    def matches_combined_of(self, players=slice(None)):
+        """Partidas por coluna de rating_combined dos jogadores dados (id ou fatia de ids)"""
+        counts = self.matches_grid[players, 1:, 1:]
+        return counts.reshape(counts.shape[:-2] + (counts.shape[-2] * counts.shape[-1],))  # -1 falha sem jogadores
+    
+    def _lane(self, surface, level):
+        """Retorna a coluna de rating_combined para (superfície, nível), ou -1 se algum for desconhecido"""
+        sid = self._surface_ids.get(surface)
+        lid = self._level_ids.get(level)
+        if sid is None or lid is None:
+            return -1
+        return sid * len(self._level_names) + lid
+    
+    def intern_names(self, players, surfaces, levels):
+        """Registra listas de jogadores, superfícies e níveis de uma vez e retorna arrays com seus ids"""
+        player_ids = np.array([self._register(self._player_ids, self._player_names, name) for name in players], dtype=np.int64)
+        surface_ids = np.array([self._register(self._surface_ids, self._surface_names, surface) if surface else -1
+                                for surface in surfaces], dtype=np.int64)
+        level_ids = np.array([self._register(self._level_ids, self._level_names, level) if level else -1
+                              for level in levels], dtype=np.int64)
+        self._grow()
+        return player_ids, surface_ids, level_ids
+
+    def fit_player_index(self, df):
+        """
+        Registra de uma vez todos os jogadores de df (colunas winner_name e loser_name), na ordem de aparição,
+        alocando os arrays de estado para eles. Retorna os ids na ordem de pd.unique (nomes ausentes são ignorados).
+        """
+        names = pd.unique(df[['winner_name', 'loser_name']].to_numpy().ravel())
+        names = names[pd.notna(names)]
+        player_ids, _, _ = self.intern_names(names, [], [])
+        return player_ids
 
     def parse_score(self, score):
         if pd.isna(score) or not isinstance(score, str):
             return 1.0
+        return _parse_score(score)
 
-        # Remove parênteses e textos como 'RET', 'W/O', etc.
-        clean_score = re.sub(r'\(.*?\)|[A-Za-z/]+', '', score).strip()
-        
-        sets_won = {"winner": 0, "loser": 0}
-        total_games_diff = 0
-
-        for set_score in clean_score.split():
-            if '-' not in set_score:
-                continue
-            try:
-                w, l = map(int, set_score.split('-'))
-                sets_won["winner"] += w > l
-                sets_won["loser"] += l > w
-                total_games_diff += abs(w - l)
-            except ValueError:
-                continue
-
-        set_diff = sets_won["winner"] - sets_won["loser"]
-        if set_diff <= 0:
-            return 1.0
-
-        return min(2.0, 1.0 + 0.1 * set_diff + 0.01 * total_games_diff)
+    def parse_scores(self, scores):
+        """Versão vetorizada de parse_score para uma coluna de placares"""
+        # Cada placar distinto é analisado uma única vez (código -1 = ausente)
+        codes, uniques = pd.factorize(pd.Series(scores, dtype=object))
+        factors = np.ones(len(uniques) + 1)  # Última posição: fator dos ausentes
+        is_text = np.array([isinstance(score, str) for score in uniques], dtype=bool)
+        
+        # Mesma limpeza de parse_score e extração de todos os sets válidos de uma vez
+        clean = pd.Series(uniques[is_text], index=np.flatnonzero(is_text), dtype=object)
+        clean = clean.str.translate(_SCORE_LETTERS).str.replace(_SCORE_PARENTHESES, '', regex=True)
+        sets = clean.str.findall(_SCORE_SET)
+        games = np.array(list(chain.from_iterable(sets)), dtype=float).reshape(-1, 2)
+        rows = np.repeat(clean.index.to_numpy(), sets.str.len().to_numpy())
+        w, l = games[:, 0], games[:, 1]
+        
+        # Sets e games somados por placar
+        set_diff = np.bincount(rows, weights=w > l, minlength=len(factors)) - np.bincount(rows, weights=l > w, minlength=len(factors))
+        total_games_diff = np.bincount(rows, weights=np.abs(w - l), minlength=len(factors))
+        won = set_diff > 0
+        factors[won] = np.minimum(2.0, 1.0 + 0.1 * set_diff[won] + 0.01 * total_games_diff[won])
+        return factors[codes]
 
     def calculate_seed_factor(self, win_seed, loser_seed):
         """Calcula fator baseado nas seeds dos jogadores"""
-        # Inicializa com valor neutro
-        seed_factor = 1.0
-        
-        # Se ambas as seeds existem, podemos comparar
-        if win_seed is not None and loser_seed is not None:
-            # Se o perdedor tinha seed melhor (menor número)
-            if loser_seed < win_seed:
-                # Quanto maior a diferença, maior o fator
-                seed_factor = 1.0 + min(0.5, (win_seed - loser_seed) / 10)
-            # Se o vencedor tinha seed muito melhor que o perdedor
-            elif win_seed < loser_seed and (loser_seed - win_seed) > 8:
-                # Vitória esperada = menos pontos
-                seed_factor = max(0.7, 1.0 - (loser_seed - win_seed) / 20)
-                
-        return seed_factor
+        return _seed_factor(win_seed, loser_seed)
+    
+    @staticmethod
+    def _seed_numbers(seeds):
+        """Seeds como floats, convertidas como o int() de calculate_match_weight (inválidas = NaN)"""
+        seeds = pd.Series(seeds, dtype=object)
+        numbers = np.trunc(pd.to_numeric(seeds, errors='coerce').to_numpy(dtype=float))
+        # int() só aceita textos de inteiros: '3.0' ou '1e1' ficam sem seed
+        is_text = seeds.map(lambda seed: isinstance(seed, str)).to_numpy(dtype=bool)
+        if is_text.any():
+            integer = seeds[is_text].str.fullmatch(r'\s*[+-]?\d+\s*').to_numpy(dtype=bool)
+            numbers[np.flatnonzero(is_text)[~integer]] = np.nan
+        return numbers
+    
+    def calculate_seed_factors(self, win_seeds, loser_seeds):
+        """Versão vetorizada de calculate_seed_factor para colunas de seeds (ausentes ou inválidas = sem seed)"""
+        # NaN em qualquer lado resulta em fator neutro
+        diff = self._seed_numbers(win_seeds) - self._seed_numbers(loser_seeds)
+        
+        # Perdedor com seed melhor: bônus até 0.5; vencedor com seed muito melhor (> 8): redução até 0.7
+        return np.where(diff > 0, 1.0 + np.minimum(0.5, diff / 10),
+                        np.where(diff < -8, np.maximum(0.7, 1.0 + diff / 20), 1.0))
     
     def calculate_time_decay_factor(self, match_date):
         """Calcula o fator de decaimento baseado no tempo desde a partida"""
+        if self.decay_rate is None:
+            return 1.0  # Decaimento desativado
         if pd.isna(match_date) or not match_date:
             return 1.0  # Sem data, sem decaimento
             
@@ -148,42 +551,50 @@ class MMRCalculator:
             else:
                 return 1.0  # Formato inválido, sem decaimento
                 
-            # Calcula anos desde a partida (fração de anos)
-            days_diff = (self.current_date - match_dt).days
-            years_diff = days_diff / 365.25
+            self._follow_match_date(match_dt)
             
-            # Aplica fórmula de decaimento exponencial: decay_rate^years
-            decay_factor = self.decay_rate ** years_diff
-            
-            # Garante um valor mínimo de 0.1 para partidas muito antigas
-            return max(0.1, decay_factor)
+            return _time_decay_factor(self.decay_rate, (self.current_date - match_dt).days)
             
         except Exception as e:
             print(f"Erro ao calcular decaimento temporal: {e}")
             return 1.0  # Em caso de erro, sem decaimento
 
-    def update_rating(self, winner, loser, score, surface, tourney_level, win_seed=None, loser_seed=None, tourney_date=None):
-        """Atualiza os ratings baseado no resultado da partida"""
-        # Garante que os jogadores existam no sistema
-        self.ensure_player_initialized(winner, surface, tourney_level)
-        self.ensure_player_initialized(loser, surface, tourney_level)
+    def precompute_decay(self, dates):
+        """
+        Versão vetorizada de calculate_time_decay_factor para uma coluna de datas
+        (textos 'YYYYMMDD', datetime ou datetime64; datas ausentes ou inválidas ficam sem decaimento)
+        Sem data atual definida, a data atual passa a ser a mais recente da coluna.
+        """
+        dates = pd.Series(dates)
+        decay = np.ones(len(dates))
+        if self.decay_rate is None:
+            return decay  # Decaimento desativado
+        
+        # Converte todas as datas de uma vez, aceitando os mesmos tipos da versão escalar:
+        # textos de 8 dígitos e objetos datetime (números como 20240101 ficam sem decaimento)
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            values = dates.astype(object)
+            datetimes = None
+            if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+                # Tipos misturados: separa textos e datetimes elemento a elemento
+                datetimes = values.where(values.map(lambda date: isinstance(date, datetime)))
+                values = values.where(values.map(lambda date: isinstance(date, str)))
+            text = values.astype('string')
+            dates = pd.to_datetime(text.where(text.str.fullmatch(r'\d{8}', na=False)), format='%Y%m%d', errors='coerce')
+            if datetimes is not None:
+                dates = dates.fillna(pd.to_datetime(datetimes, errors='coerce'))
+        dates = dates.to_numpy(dtype='datetime64[ns]')
+        valid = ~np.isnat(dates)
+        if valid.any():
+            self._follow_match_date(pd.Timestamp(dates[valid].max()).to_pydatetime())
+        
+        # Dias completos desde a partida (como timedelta.days) e fator decay_rate^anos, com mínimo de 0.1
+        days = (np.datetime64(self.current_date, 'ns') - dates[valid]) // np.timedelta64(1, 'D')
+        decay[valid] = np.maximum(0.1, np.power(self.decay_rate, days / 365.25))
+        return decay
 
-        # Obtém ratings atuais
-        rw = self.get_rating(winner)
-        rl = self.get_rating(loser)
-        
-        # Ratings específicos por superfície
-        rw_surface = self.get_rating(winner, surface=surface)
-        rl_surface = self.get_rating(loser, surface=surface)
-        
-        # Ratings específicos por nível de torneio
-        rw_level = self.get_rating(winner, level=tourney_level)
-        rl_level = self.get_rating(loser, level=tourney_level)
-        
-        # Ratings combinados (superfície + nível)
-        rw_combined = self.get_rating(winner, surface=surface, level=tourney_level)
-        rl_combined = self.get_rating(loser, surface=surface, level=tourney_level)
-        
+    def calculate_match_weight(self, score, tourney_level, win_seed=None, loser_seed=None):
+        """Calcula os fatores de ajuste que não dependem do estado nem da data (seed, placar e torneio)"""
         # Converte seeds para formato numérico se possível
         try:
             win_seed = int(win_seed) if win_seed is not None and pd.notna(win_seed) else None
@@ -195,115 +606,198 @@ class MMRCalculator:
         except (ValueError, TypeError):
             loser_seed = None
 
-        # Calcula fatores de ajuste
-        seed_factor = self.calculate_seed_factor(win_seed, loser_seed)
-        score_factor = self.parse_score(score)
-        level_weight = TOURNEY_WEIGHTS.get(str(tourney_level).upper(), 1.0)  # Convertido para string
-        time_decay_factor = self.calculate_time_decay_factor(tourney_date)
-        
-        # Probabilidade esperada de vitória (ELO padrão)
-        expected_w = 1 / (1 + 10 ** ((rl - rw) / 400))
-        
-        # Probabilidade esperada considerando superfície + nível (50% geral, 25% superfície, 25% nível)
-        expected_w_combined = 1 / (1 + 10 ** (((rl + rl_surface + rl_level + rl_combined) - 
-                                               (rw + rw_surface + rw_level + rw_combined)) / 1600))
-        
-        # Média das duas expectativas
-        expected_w_final = (expected_w + expected_w_combined) / 2
-        
-        # Fator de experiência (K menor para jogadores com mais partidas)
-        k_winner = self.k / (1 + self.matches_played.get(winner, 0) / 100)
-        k_loser = self.k / (1 + self.matches_played.get(loser, 0) / 100)
-        
-        # Calcula delta base com o novo fator de decaimento temporal
-        delta_base = score_factor * seed_factor * level_weight * time_decay_factor * (1 - expected_w_final)
-        
-        # Delta ajustado para cada jogador
-        delta_winner = k_winner * delta_base
-        delta_loser = k_loser * delta_base
-        
-        # Atualiza contadores de partidas
-        self.matches_played[winner] = self.matches_played.get(winner, 0) + 1
-        self.matches_played[loser] = self.matches_played.get(loser, 0) + 1
-        
-        # Atualiza contadores de partidas por superfície
-        if surface:
-            self.matches_by_surface[winner][surface] = self.matches_by_surface[winner].get(surface, 0) + 1
-            self.matches_by_surface[loser][surface] = self.matches_by_surface[loser].get(surface, 0) + 1
-        
-        # Atualiza contadores de partidas por nível
-        if tourney_level:
-            self.matches_by_level[winner][tourney_level] = self.matches_by_level[winner].get(tourney_level, 0) + 1
-            self.matches_by_level[loser][tourney_level] = self.matches_by_level[loser].get(tourney_level, 0) + 1
-        
-        # Atualiza contadores de partidas combinadas
-        if surface and tourney_level:
-            combined_key = f"{surface}_{tourney_level}"
-            self.matches_combined[winner][combined_key] = self.matches_combined[winner].get(combined_key, 0) + 1
-            self.matches_combined[loser][combined_key] = self.matches_combined[loser].get(combined_key, 0) + 1
+        return {
+            "seed": self.calculate_seed_factor(win_seed, loser_seed),
+            "score": self.parse_score(score),
+            "tourney": TOURNEY_WEIGHTS.get(str(tourney_level).upper(), 1.0),  # Convertido para string
+        }
+
+    def apply_matches(self, winner_ids, loser_ids, surface_ids, level_ids, weights):
+        """
+        Aplica em ordem partidas já convertidas em ids (ver intern_names).
+        weights é o produto dos fatores de placar, seed, torneio e decaimento de cada partida.
+        Retorna arrays com delta do vencedor, delta do perdedor e probabilidade esperada.
+        """
+        surface_ids = np.asarray(surface_ids, dtype=np.int64)
+        level_ids = np.asarray(level_ids, dtype=np.int64)
+        winner_ids = np.asarray(winner_ids, dtype=np.int64)
+        loser_ids = np.asarray(loser_ids, dtype=np.int64)
+        n = len(winner_ids)
+        delta_winner = np.empty(n)
+        delta_loser = np.empty(n)
+        expected = np.empty(n)
+        args = (
+            self.rating_arr, self.matches_played_arr,
+            self.rating_surface, self.rating_level,
+            self.rating_combined, self.matches_grid,
+            winner_ids, loser_ids, surface_ids, level_ids,
+            np.asarray(weights, dtype=np.float64), float(self.k),
+            delta_winner, delta_loser, expected
+        )
+        
+        # Épocas longas (partidas sem jogadores em comum) compensam o custo de disparar as threads
+        epoch_starts = None
+        if self.parallel and n >= PARALLEL_MIN_EPOCH:
+            epoch_starts = _epoch_starts(winner_ids, loser_ids, len(self.rating_arr))
+        if epoch_starts is not None and n >= PARALLEL_MIN_EPOCH * (len(epoch_starts) - 1):
+            _apply_matches_parallel(epoch_starts, *args)
+        elif mmr_kernel is not None:
+            getattr(mmr_kernel, f"apply_matches_{np.dtype(self.rating_dtype).name}")(*args)
+        else:
+            _apply_matches(*args)
         
-        # Atualiza ratings gerais
-        self.ratings[winner] += delta_winner
-        self.ratings[loser] -= delta_loser
+        self._version += 1
+        return delta_winner, delta_loser, expected
 
-        # Atualiza ratings por superfície
-        if surface:
-            self.surfaces[winner][surface] += delta_winner
-            self.surfaces[loser][surface] -= delta_loser
+    def update_ratings_batch(self, df):
+        """
+        Atualiza os ratings com um bloco de partidas em ordem (colunas winner_name, loser_name, surface,
+        score, tourney_level, winner_seed, loser_seed e tourney_date, sem valores ausentes nos nomes).
+        A data atual do MMR vale para todo o bloco.
+        Retorna DataFrame com delta_winner, delta_loser, time_decay e expected, no índice de df.
+        """
+        # Nomes, superfícies e níveis viram ids inteiros de uma vez (na ordem de aparição)
+        player_codes, players = pd.factorize(df[['winner_name', 'loser_name']].to_numpy().ravel())
+        if (player_codes < 0).any():
+            raise ValueError("Há partidas sem winner_name ou loser_name no bloco")
+        surface_codes, surfaces = pd.factorize(df['surface'].to_numpy())
+        level_codes, levels = pd.factorize(df['tourney_level'].to_numpy())
+        player_ids, surface_ids, level_ids = self.intern_names(players, surfaces, levels)
+        player_ids = player_ids[player_codes]
+        # factorize marca valores ausentes com o código -1, que passa a indicar o id -1 (ausente)
+        surface_ids = np.append(surface_ids, -1)[surface_codes]
+        level_ids = np.append(level_ids, -1)[level_codes]
 
-        # Atualiza ratings por tipo de torneio
-        if tourney_level:
-            self.levels[winner][tourney_level] += delta_winner
-            self.levels[loser][tourney_level] -= delta_loser
-            
-        # Atualiza ratings combinados
-        if surface and tourney_level:
-            combined_key = f"{surface}_{tourney_level}"
-            self.combined[winner][combined_key] += delta_winner
-            self.combined[loser][combined_key] -= delta_loser
+        # Fatores de placar, seed, torneio e decaimento de cada partida
+        score = self.parse_scores(df['score'])
+        seed = self.calculate_seed_factors(df['winner_seed'], df['loser_seed'])
+        tourney_codes = pd.Index(LEVELS).get_indexer(df['tourney_level'].astype(str).str.upper()).astype(np.int8)  # -1 = outro nível
+        tourney = np.where(tourney_codes >= 0, LEVEL_WEIGHT_ARR[tourney_codes], 1.0)
+        time_decay = self.precompute_decay(df['tourney_date'])
+        weights = score * seed * tourney * time_decay
+
+        delta_winner, delta_loser, expected = self.apply_matches(
+            player_ids[0::2], player_ids[1::2], surface_ids, level_ids, weights
+        )
+        return pd.DataFrame({
+            'delta_winner': delta_winner,
+            'delta_loser': delta_loser,
+            'time_decay': time_decay,
+            'expected': expected,
+        }, index=df.index)
+
+    def update_rating(self, winner, loser, score, surface, tourney_level, win_seed=None, loser_seed=None, tourney_date=None):
+        """Atualiza os ratings baseado no resultado da partida"""
+        # Garante que os jogadores existam no sistema
+        (winner_id, loser_id), surface_ids, level_ids = self.intern_names([winner, loser], [surface], [tourney_level])
+
+        # Calcula fatores de ajuste
+        factors = self.calculate_match_weight(score, tourney_level, win_seed, loser_seed)
+        factors["time_decay"] = self.calculate_time_decay_factor(tourney_date)
+        weight = factors["score"] * factors["seed"] * factors["tourney"] * factors["time_decay"]
+        
+        delta_winner, delta_loser, expected = self.apply_matches(
+            [winner_id], [loser_id], surface_ids, level_ids, [weight]
+        )
+        factors["expected"] = expected[0].item()
         
         return {
-            "delta_winner": delta_winner,
-            "delta_loser": delta_loser,
-            "factors": {
-                "seed": seed_factor,
-                "score": score_factor,
-                "tourney": level_weight,
-                "time_decay": time_decay_factor,
-                "expected": expected_w_final
-            }
+            "delta_winner": delta_winner[0].item(),
+            "delta_loser": delta_loser[0].item(),
+            "factors": factors
         }
     
+    def _sync_caches(self):
+        """Descarta rankings e índices calculados antes da última alteração dos ratings"""
+        if self._rankings_version != self._version:
+            self._rankings_cache.clear()
+            self._rank_index.clear()
+            self._rankings_version = self._version
+    
     def get_combined_rankings(self, surface=None, level=None, min_matches=3):
-        """Retorna ranking combinado por superfície e tipo de torneio"""
-        result = {}
+        """
+        Retorna ranking combinado por superfície e tipo de torneio.
+        O ranking calculado fica em cache até os ratings mudarem; cada chamada recebe uma cópia.
+        """
+        self._sync_caches()
+        key = (surface, level, min_matches)
+        if key not in self._rankings_cache:
+            if len(self._rankings_cache) >= RANKINGS_CACHE_SIZE:
+                del self._rankings_cache[next(iter(self._rankings_cache))]  # Descarta o mais antigo
+            self._rankings_cache[key] = self._compute_combined_rankings(surface, level, min_matches)
+        return dict(self._rankings_cache[key])
+    
+    def get_top_rankings(self, surface=None, level=None, min_matches=3, top_n=10):
+        """Retorna os top_n (nome, rating) do ranking de get_combined_rankings, em ordem decrescente"""
+        self._sync_caches()
+        bucket = self._bucket(surface, level)
+        if bucket is None:
+            return []
+        values, counts = bucket
+        
+        # Índice com os melhores do contexto em ordem de rating, reaproveitado até os ratings mudarem.
+        # É parcial: só é ampliado (dobrando) quando não tem jogadores suficientes com min_matches
+        key = (surface, level)
+        order, complete = self._rank_index.get(key, (None, False))
+        while True:
+            if order is not None:
+                top = order[counts[order] >= min_matches][:top_n]
+                if len(top) >= top_n or complete:
+                    break
+            played = np.flatnonzero(counts > 0)
+            size = max(RANK_INDEX_MIN_SIZE, 2 * top_n, 0 if order is None else 2 * len(order))
+            order = _top_order(values, played, size)
+            complete = len(order) == len(played)
+            self._rank_index[key] = (order, complete)
+        
+        return [(self._player_names[i], value) for i, value in zip(top, values[top].tolist())]
+    
+    def _bucket(self, surface, level):
+        """Retorna (ratings, partidas) por jogador no contexto dado, ou None se o contexto não existir"""
+        n = len(self._player_names)
+        sid = self._surface_ids.get(surface)
+        lid = self._level_ids.get(level)
         
-        # Se ambos estiverem definidos, retorna o ranking específico
+        # Se ambos estiverem definidos, usa o rating combinado
         if surface and level:
-            combined_key = f"{surface}_{level}"
-            for player in self.combined:
-                if combined_key in self.combined[player] and self.matches_combined[player].get(combined_key, 0) >= min_matches:
-                    result[player] = self.combined[player][combined_key]
+            lane = self._lane(surface, level)
+            if lane < 0:
+                return None
+            return self.rating_combined[:n, lane], self.matches_grid[:n, sid + 1, lid + 1]
         
         # Se apenas a superfície estiver definida
-        elif surface:
-            for player in self.surfaces:
-                if surface in self.surfaces[player] and self.matches_by_surface[player].get(surface, 0) >= min_matches:
-                    result[player] = self.surfaces[player][surface]
+        if surface:
+            if sid is None:
+                return None
+            return self.rating_surface[:n, sid], self.matches_grid[:n, sid + 1, :].sum(axis=1)
         
         # Se apenas o nível estiver definido
-        elif level:
-            for player in self.levels:
-                if level in self.levels[player] and self.matches_by_level[player].get(level, 0) >= min_matches:
-                    result[player] = self.levels[player][level]
-        
-        # Sem filtros, retorna o ranking geral
-        else:
-            result = {player: rating for player, rating in self.ratings.items() 
-                     if self.matches_played.get(player, 0) >= min_matches}
-            
-        return result
+        if level:
+            if lid is None:
+                return None
+            return self.rating_level[:n, lid], self.matches_grid[:n, :, lid + 1].sum(axis=1)
         
+        # Sem filtros, usa o rating geral
+        return self.rating_arr[:n], self.matches_played_arr[:n]
+    
+    def _compute_combined_rankings(self, surface, level, min_matches):
+        """Calcula o ranking de get_combined_rankings a partir dos arrays de estado"""
+        bucket = self._bucket(surface, level)
+        if bucket is None:
+            return {}
+        values, counts = bucket
+        
+        # Apenas jogadores que atuaram no contexto e com o mínimo de partidas
+        selected = np.flatnonzero((counts > 0) & (counts >= min_matches))
+        return {self._player_names[i]: value for i, value in zip(selected, values[selected].tolist())}
+        
+    def _follow_match_date(self, match_dt):
+        """Sem data atual definida explicitamente, avança a data atual até a partida mais recente"""
+        if self._follow_match_dates and (self.current_date is None or match_dt > self.current_date):
+            self.current_date = match_dt
+            if self.last_decay_date is None:
+                self.last_decay_date = match_dt
+    
     def set_current_date(self, date):
         """Define uma data específica como 'atual' para cálculos de decaimento"""
         if isinstance(date, str) and len(date) == 8 and date.isdigit():
@@ -312,26 +806,27 @@ class MMRCalculator:
             self.current_date = date
         else:
             raise ValueError("A data deve estar no formato 'YYYYMMDD' ou ser um objeto datetime")
+        self._follow_match_dates = False
+        if self.last_decay_date is None:
+            self.last_decay_date = self.current_date
             
     def apply_global_decay(self, reference_date=None):
         """
         Aplica decaimento baseado no tempo a todos os ratings, independente da atividade
         """
         if reference_date is not None:
-            old_date = self.current_date
+            old_date, old_follow = self.current_date, self._follow_match_dates
             self.set_current_date(reference_date)
+        elif self.current_date is None:
+            raise ValueError("Defina a data atual (current_date) antes de aplicar o decaimento global")
         
         print(f"Aplicando decaimento global para todos os jogadores (data de referência: {self.current_date.strftime('%d/%m/%Y')})")
         
-        # Variáveis para rastrear estatísticas
-        total_changes = 0
-        max_decay = 0
-        affected_players = 0
-        
         # Calcula o fator de decaimento anual (em escala diária)
         # Por exemplo, decay_rate de 0.85 = 15% de decaimento anual
         # Para calcular o fator diário: decay_rate^(1/365.25)
-        daily_decay_factor = self.decay_rate ** (1/365.25)
+        # (decay_rate None desativa o decaimento: fator 1)
+        daily_decay_factor = 1.0 if self.decay_rate is None else self.decay_rate ** (1/365.25)
         
         # Determina quantos dias aplicar o decaimento (desde a última vez que foi aplicado)
         # Podemos armazenar a última data de aplicação do decay
@@ -345,45 +840,37 @@ class MMRCalculator:
         # Calcular o fator de decaimento acumulado para este período
         decay_multiplier = daily_decay_factor ** days_since_last_decay
         
-        # Aplicar o decaimento a todos os jogadores
-        for player in self.ratings.keys():
-            # Pular jogadores com poucas partidas (opcional)
-            if self.matches_played.get(player, 0) < 3:
-                continue
-                
-            original_rating = self.ratings[player]
-            
-            # Aplicar decaimento em todos os tipos de rating
-            self.ratings[player] *= decay_multiplier
-            
-            # Aplicar aos ratings por superfície
-            if player in self.surfaces:
-                for surface in self.surfaces[player]:
-                    self.surfaces[player][surface] *= decay_multiplier
-                    
-            # Aplicar aos ratings por nível
-            if player in self.levels:
-                for level in self.levels[player]:
-                    self.levels[player][level] *= decay_multiplier
-                    
-            # Aplicar aos ratings combinados
-            if player in self.combined:
-                for key in self.combined[player]:
-                    self.combined[player][key] *= decay_multiplier
-            
-            # Calcular estatísticas
-            rating_change = original_rating - self.ratings[player]
-            if rating_change > 0:
-                total_changes += rating_change
-                max_decay = max(max_decay, rating_change)
-                affected_players += 1
+        # Aplicar o decaimento a todos os jogadores,
+        # pulando jogadores com poucas partidas (opcional)
+        n = len(self._player_names)
+        active = self.matches_played_arr[:n] >= 3
+        original_ratings = self.rating_arr[:n].copy()
+        
+        # Aplicar decaimento em todos os tipos de rating (apenas nas chaves em que o jogador atuou),
+        # multiplicando no próprio array com where em vez de copiar as posições por indexação booleana
+        if decay_multiplier != 1:
+            for ratings, counts in ((self.rating_surface, self.matches_by_surface_of(slice(0, n))),
+                                    (self.rating_level, self.matches_by_level_of(slice(0, n))),
+                                    (self.rating_combined, self.matches_combined_of(slice(0, n)))):
+                np.multiply(ratings[:n], decay_multiplier, out=ratings[:n], where=active[:, None] & (counts > 0))
+            np.multiply(self.rating_arr[:n], decay_multiplier, out=self.rating_arr[:n], where=active)
+        
+        # Calcular estatísticas
+        rating_changes = original_ratings - self.rating_arr[:n]
+        decayed = rating_changes[rating_changes > 0]
+        total_changes = sum(decayed.tolist())
+        max_decay = decayed.max(initial=0).item()
+        affected_players = len(decayed)
+        
+        self._version += 1
         
         # Atualizar a data da última aplicação de decay
         self.last_decay_date = self.current_date
         
         # Restaurar a data original se necessário
         if reference_date is not None:
-            self.set_current_date(old_date)
+            self.current_date = old_date  # Pode ser None se ainda não havia data
+            self._follow_match_dates = old_follow
             
         return {
             "affected_players": affected_players,
@@ -0,0 +1,32 @@
+"""
+Compila antecipadamente (AOT) o kernel de partidas do MMRCalculator no módulo de extensão mmr_kernel,
+para que o primeiro processamento não pague a compilação JIT do Numba.
+
+Uso: python mmr_kernel_aot.py  (gera mmr_kernel.*.so nesta pasta; requer Numba e um compilador C)
+Sem o módulo compilado, o MMRCalculator usa o kernel @njit ou, sem Numba, Python puro.
+"""
+import os
+
+from numba.pycc import CC
+
+from mmr_calculator import _apply_matches, _kernel_source_hash
+
+# Argumentos de _apply_matches: ratings (float32 ou float64 em modo científico), contadores int32,
+# ids de partidas int64, pesos, k e arrays de saída float64
+ARGUMENT_TYPES = "{r}[:], i4[:], {r}[:, :], {r}[:, :], {r}[:, :], i4[:, :, :], i8[:], i8[:], i8[:], i8[:], f8[:], f8, f8[:], f8[:], f8[:]"
+
+cc = CC('mmr_kernel')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Identifica o código do kernel compilado; o MMRCalculator ignora o módulo se o kernel mudar depois
+SOURCE_HASH = _kernel_source_hash()
+
+@cc.export('source_hash', 'i8()')
+def source_hash():
+    return SOURCE_HASH
+
+for name, rating_type in (("apply_matches_float32", "f4"), ("apply_matches_float64", "f8")):
+    cc.export(name, f"void({ARGUMENT_TYPES.format(r=rating_type)})")(_apply_matches.py_func)
+
+if __name__ == "__main__":
+    cc.compile()